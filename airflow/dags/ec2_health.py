@@ -0,0 +1,122 @@
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+import asyncio
+from typing import Dict, Any, List, Tuple
+
+# Maximum number of instance IDs EC2 accepts in one describe_instance_status call
+DESCRIBE_INSTANCE_STATUS_BATCH_SIZE = 100
+
+# Instance states that will never turn into a healthy instance
+FAILED_INSTANCE_STATES = ('shutting-down', 'terminated', 'stopping', 'stopped')
+
+# EC2 client shared by everything running in this process
+_EC2_CLIENT = None
+
+def get_ec2_client():
+    """Return the process-wide EC2 client, creating it on first use."""
+    global _EC2_CLIENT
+    if _EC2_CLIENT is None:
+        import boto3
+        _EC2_CLIENT = boto3.client('ec2')
+    return _EC2_CLIENT
+
+def describe_instance_statuses(client, instance_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch the status of all instances in as few EC2 calls as possible, keyed by instance ID."""
+    statuses = {}
+    for i in range(0, len(instance_ids), DESCRIBE_INSTANCE_STATUS_BATCH_SIZE):
+        response = client.describe_instance_status(
+            InstanceIds=instance_ids[i:i + DESCRIBE_INSTANCE_STATUS_BATCH_SIZE],
+            IncludeAllInstances=True
+        )
+        statuses.update({s['InstanceId']: s for s in response['InstanceStatuses']})
+    return statuses
+
+def evaluate_instance_statuses(
+    instance_ids: List[str],
+    statuses: Dict[str, Dict[str, Any]],
+    require_status_checks: bool = True,
+) -> Tuple[List[str], List[str]]:
+    """Split instances into those still initializing and those that failed.
+    
+    Without require_status_checks an instance counts as healthy as soon as it is running,
+    instead of waiting for the EC2 system and instance status checks to report ok.
+    """
+    initializing_instances = []
+    failed_instances = []
+    for instance_id in instance_ids:
+        status = statuses.get(instance_id)
+        if status is None:
+            # Newly launched instances can take a moment to show up in the API
+            initializing_instances.append(instance_id)
+            continue
+
+        state = status['InstanceState']['Name']
+        system_status = status.get('SystemStatus', {}).get('Status', '')
+        instance_status = status.get('InstanceStatus', {}).get('Status', '')
+
+        if state in FAILED_INSTANCE_STATES:
+            failed_instances.append(instance_id)
+        elif state != 'running':
+            initializing_instances.append(instance_id)
+        elif require_status_checks and not (system_status == 'ok' and instance_status == 'ok'):
+            initializing_instances.append(instance_id)
+    return initializing_instances, failed_instances
+
+class EC2InstanceHealthTrigger(BaseTrigger):
+    """Poll EC2 from the triggerer until all instances are healthy.
+    
+    Polling starts at initial_poll_interval and doubles up to poll_interval, since a single
+    batched status call is cheap and instances often become ready shortly after the first check.
+    """
+
+    def __init__(
+        self,
+        instance_ids: List[str],
+        poll_interval: float = 30,
+        require_status_checks: bool = True,
+        initial_poll_interval: float = 5,
+    ):
+        super().__init__()
+        self.instance_ids = instance_ids
+        self.poll_interval = poll_interval
+        self.require_status_checks = require_status_checks
+        self.initial_poll_interval = initial_poll_interval
+
+    def serialize(self) -> Tuple[str, Dict[str, Any]]:
+        return (
+            "ec2_health.EC2InstanceHealthTrigger",
+            {
+                "instance_ids": self.instance_ids,
+                "poll_interval": self.poll_interval,
+                "require_status_checks": self.require_status_checks,
+                "initial_poll_interval": self.initial_poll_interval,
+            },
+        )
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        client = get_ec2_client()
+        delay = min(self.initial_poll_interval, self.poll_interval)
+        while True:
+            try:
+                # boto3 is blocking, so keep it off the triggerer's event loop
+                statuses = await loop.run_in_executor(
+                    None, describe_instance_statuses, client, self.instance_ids
+                )
+            except Exception as e:
+                self.log.warning(f"Error checking instance status: {str(e)}")
+            else:
+                initializing_instances, failed_instances = evaluate_instance_statuses(
+                    self.instance_ids, statuses, self.require_status_checks
+                )
+                if failed_instances:
+                    yield TriggerEvent({
+                        "status": "failed",
+                        "message": f"Instances are not healthy: {failed_instances}",
+                    })
+                    return
+                if not initializing_instances:
+                    yield TriggerEvent({"status": "healthy", "instance_ids": self.instance_ids})
+                    return
+                self.log.info(f"Instances still initializing: {initializing_instances}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.poll_interval)
@@ -1,32 +1,94 @@
 from airflow import DAG
 from airflow.operators.bash import BashOperator
-from airflow.models import Variable
 from airflow.operators.python import PythonOperator
+from airflow.exceptions import AirflowRescheduleException
+from airflow.sensors.base import BaseSensorOperator, PokeReturnValue
+from airflow.sensors.date_time import DateTimeSensorAsync
+from airflow.utils import timezone
+from airflow.utils.email import send_email
+from airflow.utils.state import TaskInstanceState
 from datetime import datetime, timedelta
-import json
+import ijson
+import orjson
 import os
 import uuid
 import logging
-import traceback
 import subprocess
+import tempfile
 from typing import Dict, Any, List
-import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import random
 
+from ec2_health import (
+    EC2InstanceHealthTrigger,
+    describe_instance_statuses,
+    evaluate_instance_statuses,
+    get_ec2_client,
+)
+
 # Configure logging using Airflow's logging system
 logger = logging.getLogger('airflow.task')
 
+# Maximum number of characters of a payload written to the task log
+LOG_PAYLOAD_LIMIT = 2048
+
+# Pool bounding concurrent AWS API / terraform output callers across DAG runs
+AWS_API_POOL = 'aws_api'
+
+# Comma-separated recipients of the per-run failure digest
+FAILURE_EMAIL = os.environ.get('AIRFLOW_FAILURE_EMAIL', '')
+
+# Fields every DAG run conf must contain
+REQUIRED_FIELDS = frozenset({'cloud_provider', 'provider_config'})
+
+# Terraform variables that must be non-empty for AWS requests
+AWS_REQUIRED_FIELDS = frozenset({'instance_type', 'ami_id', 'subnet_id', 'security_group_ids'})
+
+# (connect, read) timeouts in seconds for webhook calls
+WEBHOOK_TIMEOUT = (5, 30)
+
+# Shared session so both webhook calls reuse one keep-alive connection and retry transient errors.
+# The webhooks only update host records, so retrying POST is safe.
+_WEBHOOK_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=frozenset(['POST']),
+        raise_on_status=False,
+    ),
+)
+_WEBHOOK_SESSION = requests.Session()
+_WEBHOOK_SESSION.mount('http://', _WEBHOOK_ADAPTER)
+_WEBHOOK_SESSION.mount('https://', _WEBHOOK_ADAPTER)
+
 default_args = {
     'owner': 'airflow',
     'depends_on_past': False,
-    'email_on_failure': True,
+    'email_on_failure': False,
     'email_on_retry': False,
     'retries': 3,
     'retry_delay': timedelta(minutes=5),
     'start_date': datetime(2025, 1, 1),
 }
 
+class CompactJson:
+    """Render a value as single-line JSON capped at a size limit, only when the log record is emitted."""
+    
+    def __init__(self, value: Any, limit: int = LOG_PAYLOAD_LIMIT):
+        self.value = value
+        self.limit = limit
+    
+    def __str__(self) -> str:
+        text = orjson.dumps(self.value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}...(+{len(text) - self.limit} chars)"
+
 def log_task_start(task_name: str, **context) -> None:
     """Log the start of a task with relevant context."""
     logger.info(f"Starting task: {task_name}")
@@ -42,20 +104,71 @@ def log_task_end(task_name: str, success: bool, **context) -> None:
     if not success:
         logger.error(f"Task {task_name} failed with error: {context['task_instance'].error}")
 
+def notify_dag_run_failure(context) -> None:
+    """Send a single failure digest for a DAG run instead of one email per failed task try."""
+    dag_run = context['dag_run']
+    failed_tasks = [ti.task_id for ti in dag_run.get_task_instances(state=TaskInstanceState.FAILED)]
+    subject = f"DAG {dag_run.dag_id} run {dag_run.run_id} failed"
+    body = f"Failed tasks: {', '.join(failed_tasks) or 'none recorded'}"
+    logger.error(f"{subject}. {body}")
+    
+    recipients = [address.strip() for address in FAILURE_EMAIL.split(',') if address.strip()]
+    if recipients:
+        send_email(to=recipients, subject=subject, html_content=body)
+
+def run_terraform_output(base_dir: str, name: str) -> Any:
+    """Run `terraform output -json <name>` in the given directory and return the parsed value.
+    
+    Asking Terraform for a single named output means only that value is emitted, and the
+    JSON is parsed straight off the pipe instead of being buffered into a string first.
+    """
+    cmd = ["terraform", "output", "-json", name]
+    logger.info(f"Executing command: {' '.join(cmd)} (cwd={base_dir})")
+    
+    parse_error = None
+    # stderr goes to a temp file rather than a pipe: nothing reads it while stdout is parsed,
+    # so verbose stderr (e.g. TF_LOG=DEBUG) would otherwise fill the pipe and deadlock
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(cmd, cwd=base_dir, stdout=subprocess.PIPE, stderr=stderr_file) as process:
+            try:
+                value = next(ijson.items(process.stdout, '', use_float=True))
+            except (ijson.JSONError, StopIteration) as e:
+                parse_error = e
+            # Drain whatever is left on stdout and wait for terraform to exit
+            process.communicate()
+        
+        if process.returncode != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode(errors='replace')
+            raise Exception(f"Failed to get Terraform output: {stderr}")
+    if parse_error is not None:
+        raise Exception(f"Failed to parse Terraform output: {parse_error}")
+    return value
+
+def load_terraform_instances(base_dir: str, **context) -> Dict[str, Any]:
+    """Load the `instances` output returned by extract_instance_details, running terraform only if it is missing."""
+    extracted = context['task_instance'].xcom_pull(task_ids='extract_instance_details')
+    instances = extracted['instances'] if extracted else None
+    if instances is None:
+        logger.info("No Terraform output found in XCom, querying Terraform directly")
+        instances = run_terraform_output(base_dir, 'instances')
+    return instances
+
 def prepare_terraform_vars(**context) -> Dict[str, Any]:
     """Prepare Terraform variables based on the cloud provider."""
+    task_name = "prepare_terraform_vars"
+    success = False
     try:
-        log_task_start("prepare_terraform_vars", **context)
+        log_task_start(task_name, **context)
         
         # Get the request data from the API
         request_data = context['dag_run'].conf
-        logger.info(f"Received request data: {json.dumps(request_data, indent=2)}")
+        logger.debug("Received request data: %s", CompactJson(request_data))
         
         # Validate required fields
-        required_fields = ['cloud_provider', 'provider_config']
-        missing_fields = [field for field in required_fields if field not in request_data]
+        missing_fields = REQUIRED_FIELDS - request_data.keys()
         if missing_fields:
-            raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
+            raise ValueError(f"Missing required fields: {', '.join(sorted(missing_fields))}")
         
         cloud_provider = request_data['cloud_provider']
         logger.info(f"Processing request for cloud provider: {cloud_provider}")
@@ -64,13 +177,9 @@ def prepare_terraform_vars(**context) -> Dict[str, Any]:
         base_dir = f'/opt/airflow/terraform/{cloud_provider}'
         logger.info(f"Using Terraform base directory: {base_dir}")
         
-        # Get provider-specific configuration
+        # Provider and webhook configuration are already logged as part of the request data
         provider_config = request_data['provider_config']
-        logger.info(f"Provider configuration: {json.dumps(provider_config, indent=2)}")
-        
-        # Get webhook configuration (optional)
         webhook_config = request_data.get('webhook_config', {})
-        logger.info(f"Webhook configuration: {json.dumps(webhook_config, indent=2)}")
         
         # Prepare variables based on cloud provider
         if cloud_provider == 'aws':
@@ -86,33 +195,17 @@ def prepare_terraform_vars(**context) -> Dict[str, Any]:
             }
             
             # Validate AWS-specific required fields
-            aws_required = ['instance_type', 'ami_id', 'subnet_id', 'security_group_ids']
-            missing_aws = [field for field in aws_required if not variables.get(field)]
+            missing_aws = [field for field in AWS_REQUIRED_FIELDS if not variables.get(field)]
             if missing_aws:
-                raise ValueError(f"Missing required AWS fields: {', '.join(missing_aws)}")
+                raise ValueError(f"Missing required AWS fields: {', '.join(sorted(missing_aws))}")
                 
-            logger.info(f"Prepared AWS variables: {json.dumps(variables, indent=2)}")
+            logger.info("Prepared AWS variables: %s", CompactJson(variables))
         else:
             raise ValueError(f"Unsupported cloud provider: {cloud_provider}")
             
-        # Store variables in Airflow's Variable system for reference
         request_id = request_data.get('request_id', str(uuid.uuid4()))
-        var_key = f"terraform_vars_{request_id}"
-        Variable.set(var_key, json.dumps(variables))
-        logger.info(f"Stored variables in Airflow Variable system with key: {var_key}")
-        
-        # Store webhook configuration in Airflow's Variable system if provided
-        if webhook_config:
-            webhook_var_key = f"webhook_config_{request_id}"
-            Variable.set(webhook_var_key, json.dumps(webhook_config))
-            logger.info(f"Stored webhook configuration in Airflow Variable system with key: {webhook_var_key}")
-        
-        # Store webhook configuration in task instance for XCom if provided
-        if webhook_config:
-            context['task_instance'].xcom_push(key='webhook_config', value=webhook_config)
-            logger.info("Stored webhook configuration in XCom")
-        
-        # Also store in the task's return value
+        
+        # The task's return value is the single XCom downstream tasks read from
         result = {
             'cloud_provider': cloud_provider,
             'request_id': request_id,
@@ -121,227 +214,228 @@ def prepare_terraform_vars(**context) -> Dict[str, Any]:
             'variables': variables,
             'webhook_config': webhook_config  # Include webhook_config in the result
         }
-        logger.info(f"Task completed successfully. Returning: {json.dumps(result, indent=2)}")
-        log_task_end("prepare_terraform_vars", True, **context)
+        logger.debug("Task completed successfully. Returning: %s", CompactJson(result))
+        success = True
         return result
         
-    except Exception as e:
-        logger.error(f"Error in prepare_terraform_vars: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        log_task_end("prepare_terraform_vars", False, **context)
+    except Exception:
+        logger.exception("Error in %s", task_name)
         raise
+    finally:
+        log_task_end(task_name, success, **context)
 
 def get_terraform_vars(**context) -> Dict[str, Any]:
-    """Get Terraform variables from Airflow's Variable system."""
+    """Get Terraform variables from the prepare_terraform_vars XCom."""
     task_name = "get_terraform_vars"
+    success = False
     try:
         log_task_start(task_name, **context)
-        request_id = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')['request_id']
-        var_key = f"terraform_vars_{request_id}"
-        variables = json.loads(Variable.get(var_key))
+        upstream = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')
+        request_id = upstream['request_id']
+        variables = upstream['variables']
         logger.info(f"Retrieved variables for request {request_id}")
-        log_task_end(task_name, True, **context)
+        success = True
         return variables
-    except Exception as e:
-        logger.error(f"Error in {task_name}: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        log_task_end(task_name, False, **context)
+    except Exception:
+        logger.exception("Error in %s", task_name)
         raise
+    finally:
+        log_task_end(task_name, success, **context)
 
 def extract_instance_details(**context) -> Dict[str, Any]:
-    """Extract instance IDs and private IPs from Terraform output."""
+    """Extract instance IDs and private IPs from Terraform output.
+    
+    This is the only task that runs `terraform output`; the raw instances map is returned
+    alongside the details so downstream tasks can read it from XCom.
+    """
     task_name = "extract_instance_details"
+    success = False
     try:
         log_task_start(task_name, **context)
         
+        # Pull the previous task's result once and reuse it
+        upstream = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')
+        
         # Get the base directory from the previous task
-        base_dir = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')['base_dir']
+        base_dir = upstream['base_dir']
         logger.info(f"Using Terraform directory: {base_dir}")
         
         # Get the cloud provider
-        cloud_provider = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')['cloud_provider']
+        cloud_provider = upstream['cloud_provider']
         logger.info(f"Processing for cloud provider: {cloud_provider}")
         
-        # Execute terraform output command to get instance details
-        cmd = f"cd {base_dir} && terraform output -json"
-        logger.info(f"Executing command: {cmd}")
-        
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise Exception(f"Failed to get Terraform output: {result.stderr}")
-            
-        tf_output = json.loads(result.stdout)
-        logger.info(f"Terraform output: {json.dumps(tf_output, indent=2)}")
+        # Get instance details from Terraform output
+        instances = run_terraform_output(base_dir, 'instances')
+        logger.debug("Terraform instances output: %s", CompactJson(instances))
         
         # Extract instance details based on cloud provider
         instance_details = []
         if cloud_provider == 'aws':
-            if 'instance_ids' in tf_output and 'private_ips' in tf_output:
-                instance_ids = tf_output['instance_ids']['value']
-                private_ips = tf_output['private_ips']['value']
-                
-                for i, (instance_id, private_ip) in enumerate(zip(instance_ids, private_ips)):
-                    instance_details.append({
-                        'index': i + 1,
-                        'instance_id': instance_id,
-                        'private_ip': private_ip
-                    })
+            # Terraform sorts map keys as strings, so restore the module index order
+            instance_details = [
+                {
+                    'index': i + 1,
+                    'instance_id': instances[idx]['instance_id'],
+                    'private_ip': instances[idx]['private_ip']
+                }
+                for i, idx in enumerate(sorted(instances, key=int))
+            ]
         elif cloud_provider == 'oci':
-            if 'instance_ids' in tf_output and 'private_ips' in tf_output:
+            if instances:
                 logger.info("OCI Implementation TBD")
         # Log the extracted details
-        logger.info(f"Extracted instance details: {json.dumps(instance_details, indent=2)}")
+        logger.info("Extracted instance details: %s", CompactJson(instance_details))
         
-        # Store the details in Airflow Variables for reference
-        request_id = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')['request_id']
-        var_key = f"instance_details_{request_id}"
-        Variable.set(var_key, json.dumps(instance_details))
-        logger.info(f"Stored instance details in Airflow Variable system with key: {var_key}")
+        success = True
+        return {'instance_details': instance_details, 'instances': instances}
         
-        log_task_end(task_name, True, **context)
-        return instance_details
-        
-    except Exception as e:
-        logger.error(f"Error in {task_name}: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        log_task_end(task_name, False, **context)
+    except Exception:
+        logger.exception("Error in %s", task_name)
         raise
+    finally:
+        log_task_end(task_name, success, **context)
 
-def check_instance_health(**context) -> Dict[str, Any]:
-    """Check if instances are up and running with exponential backoff."""
-    task_name = "check_instance_health"
-    try:
-        log_task_start(task_name, **context)
+class InstanceHealthSensor(BaseSensorOperator):
+    """Wait for provisioned instances to pass their status checks.
+    
+    By default the first check runs on the worker; if instances are still initializing the
+    task defers to the triggerer so no worker slot is held while waiting. With
+    deferrable=False it falls back to a regular sensor that polls EC2 in poke or
+    reschedule mode, for deployments without a triggerer.
+    
+    The boto3 instance_status_ok waiter is not used: it blocks a worker for the whole wait,
+    cannot honour require_status_checks=False and keeps polling terminated instances.
+    """
+    
+    def __init__(self, *, deferrable: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self.deferrable = deferrable
+        self._instance_ids = None
+        self._require_status_checks = False
+    
+    def _load_instances(self, context) -> None:
+        """Look up the instances to check, once per sensor process."""
+        if self._instance_ids is not None:
+            return
         
         # Get the base directory and cloud provider from previous task
-        base_dir = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')['base_dir']
-        cloud_provider = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')['cloud_provider']
-        
-        # Get instance details from Terraform output
-        cmd = f"cd {base_dir} && terraform output -json"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise Exception(f"Failed to get Terraform output: {result.stderr}")
-
-        tf_output = json.loads(result.stdout)
-        logger.info(f"Terraform output: {json.dumps(tf_output, indent=2)}")
-        
-        # Extract instance IDs from the output
-        instances = tf_output['instances']['value']
-        instance_ids = [instance['instance_id'] for instance in instances.values()]
-        logger.info(f"Extracted instance IDs: {instance_ids}")
-        
-        # Initialize cloud provider client
-        if cloud_provider == 'aws':
-            import boto3
-            client = boto3.client('ec2')
-        else:
+        upstream = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')
+        base_dir = upstream['base_dir']
+        cloud_provider = upstream['cloud_provider']
+        if cloud_provider != 'aws':
             raise ValueError(f"Unsupported cloud provider: {cloud_provider}")
         
-        # Check each instance with exponential backoff
-        max_retries = 10
-        base_delay = 30  # seconds
-        max_delay = 300  # seconds
+        # Get instance details from the Terraform output returned by extract_instance_details
+        instances = load_terraform_instances(base_dir, **context)
+        
+        # By default a running instance is good enough; waiting for EC2 status checks is opt-in
+        provider_config = context['dag_run'].conf.get('provider_config', {})
+        self._require_status_checks = provider_config.get('require_status_checks', False)
+        logger.info(f"Require EC2 status checks: {self._require_status_checks}")
         
-        for attempt in range(max_retries):
-            initializing_instances = []
-            all_healthy = True
+        # Extract instance IDs from the output
+        self._instance_ids = [instance['instance_id'] for instance in instances.values()]
+        logger.info(f"Extracted instance IDs: {self._instance_ids}")
+    
+    def _initializing_instances(self) -> List[str]:
+        """Return the instances that are not healthy yet, failing fast on terminal states."""
+        statuses = describe_instance_statuses(get_ec2_client(), self._instance_ids)
+        initializing_instances, failed_instances = evaluate_instance_statuses(
+            self._instance_ids, statuses, self._require_status_checks
+        )
+        if failed_instances:
+            raise Exception(f"Instances are not healthy: {failed_instances}")
+        return initializing_instances
+    
+    def poke(self, context) -> PokeReturnValue:
+        self._load_instances(context)
+        initializing_instances = self._initializing_instances()
+        if initializing_instances:
+            logger.info(f"Instances still initializing: {initializing_instances}")
+            return PokeReturnValue(is_done=False)
+        
+        logger.info("All instances are healthy")
+        return PokeReturnValue(
+            is_done=True,
+            xcom_value={"status": "healthy", "instance_ids": self._instance_ids},
+        )
+    
+    def execute(self, context) -> Dict[str, Any]:
+        task_name = self.task_id
+        try:
+            log_task_start(task_name, **context)
             
-            for instance_id in instance_ids:
-                try:
-                    if cloud_provider == 'aws':
-                        response = client.describe_instance_status(InstanceIds=[instance_id])
-                        if not response['InstanceStatuses']:
-                            raise Exception(f"Instance {instance_id} not found")
-                        
-                        status = response['InstanceStatuses'][0]
-                        state = status['InstanceState']['Name']
-                        system_status = status.get('SystemStatus', {}).get('Status', '')
-                        instance_status = status.get('InstanceStatus', {}).get('Status', '')
-                        
-                        if state == 'pending':
-                            initializing_instances.append(instance_id)
-                            all_healthy = False
-                        elif state == 'running' and system_status == 'ok' and instance_status == 'ok':
-                            logger.info(f"Instance {instance_id} is healthy")
-                        else:
-                            raise Exception(f"Instance {instance_id} is not healthy: {state}")
-                            
-                except Exception as e:
-                    logger.error(f"Error checking instance {instance_id}: {str(e)}")
-                    all_healthy = False
-                    continue
+            if not self.deferrable:
+                result = super().execute(context)
+                log_task_end(task_name, True, **context)
+                return result
             
-            if all_healthy:
+            self._load_instances(context)
+            initializing_instances = self._initializing_instances()
+            if not initializing_instances:
                 logger.info("All instances are healthy")
                 log_task_end(task_name, True, **context)
-                return {"status": "healthy", "instance_ids": instance_ids}
+                return {"status": "healthy", "instance_ids": self._instance_ids}
             
-            if attempt < max_retries - 1:
-                # Calculate delay with exponential backoff
-                delay = min(base_delay * (2 ** attempt), max_delay)
-                logger.info(f"Attempt {attempt + 1}/{max_retries} failed. Retrying in {delay} seconds...")
-                if initializing_instances:
-                    logger.info(f"Instances still initializing: {initializing_instances}")
-                time.sleep(delay)
-            else:
-                if initializing_instances:
-                    raise Exception(f"Instances still initializing after {max_retries} attempts: {initializing_instances}")
-                else:
-                    raise Exception("Some instances are not healthy after maximum retries")
-        
-        log_task_end(task_name, False, **context)
-        raise Exception("Failed to verify instance health after maximum retries")
-        
-    except Exception as e:
-        logger.error(f"Error in {task_name}: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        log_task_end(task_name, False, **context)
-        raise
+            logger.info(f"Instances still initializing: {initializing_instances}. Deferring until they are healthy")
+            
+        except AirflowRescheduleException:
+            raise
+        except Exception:
+            logger.exception("Error in %s", task_name)
+            log_task_end(task_name, False, **context)
+            raise
+        
+        self.defer(
+            trigger=EC2InstanceHealthTrigger(
+                instance_ids=self._instance_ids,
+                poll_interval=self.poke_interval,
+                require_status_checks=self._require_status_checks,
+            ),
+            method_name='execute_complete',
+            timeout=timedelta(seconds=self.timeout),
+        )
+    
+    def execute_complete(self, context, event: Dict[str, Any]) -> Dict[str, Any]:
+        task_name = self.task_id
+        if event['status'] != 'healthy':
+            logger.error(f"Error in {task_name}: {event['message']}")
+            log_task_end(task_name, False, **context)
+            raise Exception(event['message'])
+        
+        logger.info("All instances are healthy")
+        log_task_end(task_name, True, **context)
+        return {"status": "healthy", "instance_ids": event['instance_ids']}
 
-def invoke_webhooks(**context) -> Dict[str, Any]:
-    """Invoke webhooks with the instance's private IP."""
-    task_name = "invoke_webhooks"
+def invoke_first_webhook(**context) -> Dict[str, Any]:
+    """Invoke the first webhook with the instance's private IP and schedule the second one."""
+    task_name = "invoke_first_webhook"
+    success = False
     try:
         log_task_start(task_name, **context)
         
-        # Get the base directory and request ID from previous task
-        prepare_vars_result = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')
-        base_dir = prepare_vars_result['base_dir']
-        request_id = prepare_vars_result['request_id']
-        
-        # Try to get webhook configuration from XCom
-        webhook_config = prepare_vars_result.get('webhook_config', {})
-        logger.info(f"Retrieved webhook configuration from XCom: {json.dumps(webhook_config, indent=2)}")
-        
-        # If not in XCom, try to get from Airflow Variables
-        if not webhook_config:
-            try:
-                webhook_var_key = f"webhook_config_{request_id}"
-                webhook_config = json.loads(Variable.get(webhook_var_key))
-                logger.info(f"Retrieved webhook configuration from Airflow Variables with key: {webhook_var_key}")
-            except Exception as e:
-                logger.warning(f"Failed to get webhook configuration from Airflow Variables: {str(e)}")
+        # Get the base directory and webhook configuration from previous task
+        upstream = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')
+        base_dir = upstream['base_dir']
+        webhook_config = upstream.get('webhook_config', {})
         
         # If no webhook configuration is provided, skip the webhook calls
         if not webhook_config:
             logger.info("No webhook configuration provided. Skipping webhook calls.")
-            log_task_end(task_name, True, **context)
-            return {"status": "skipped", "message": "No webhook configuration provided"}
+            success = True
+            return {
+                "status": "skipped",
+                "message": "No webhook configuration provided",
+                "second_webhook_at": timezone.utcnow().isoformat()
+            }
             
-        logger.info(f"Using webhook configuration: {json.dumps(webhook_config, indent=2)}")
+        logger.debug("Using webhook configuration: %s", CompactJson(webhook_config))
         
-        # Get instance details from Terraform output
-        cmd = f"cd {base_dir} && terraform output -json"
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise Exception(f"Failed to get Terraform output: {result.stderr}")
-
-        tf_output = json.loads(result.stdout)
-        logger.info(f"Terraform output: {json.dumps(tf_output, indent=2)}")
+        # Get instance details from the Terraform output returned by extract_instance_details
+        instances = load_terraform_instances(base_dir, **context)
+        logger.debug("Terraform instances output: %s", CompactJson(instances))
         
         # Extract private IP from the output
-        instances = tf_output['instances']['value']
         private_ip = list(instances.values())[0]['private_ip']
         logger.info(f"Extracted private IP: {private_ip}")
         
@@ -352,19 +446,50 @@ def invoke_webhooks(**context) -> Dict[str, Any]:
             "message": "Update Hosts"
         }
         
-        logger.info(f"Invoking first webhook with data: {json.dumps(first_webhook_data)}")
-        response = requests.post(
+        logger.info("Invoking first webhook with data: %s", CompactJson(first_webhook_data))
+        response = _WEBHOOK_SESSION.post(
             webhook_config['url'],
             json=first_webhook_data,
-            headers={'Content-Type': 'application/json'}
+            headers={'Content-Type': 'application/json'},
+            timeout=WEBHOOK_TIMEOUT
         )
         response.raise_for_status()
         logger.info(f"First webhook response: {response.text}")
         
-        # Wait for 15-20 seconds
+        # The second webhook goes out 15-20 seconds later; the wait is deferred to the triggerer
         wait_time = random.randint(15, 20)
-        logger.info(f"Waiting for {wait_time} seconds before second webhook...")
-        time.sleep(wait_time)
+        second_webhook_at = timezone.utcnow() + timedelta(seconds=wait_time)
+        logger.info(f"Second webhook scheduled in {wait_time} seconds at {second_webhook_at}")
+        
+        success = True
+        return {
+            "status": "success",
+            "private_ip": private_ip,
+            "second_webhook_at": second_webhook_at.isoformat()
+        }
+        
+    except Exception:
+        logger.exception("Error in %s", task_name)
+        raise
+    finally:
+        log_task_end(task_name, success, **context)
+
+def invoke_second_webhook(**context) -> Dict[str, Any]:
+    """Invoke the second webhook once the wait after the first one has elapsed."""
+    task_name = "invoke_second_webhook"
+    success = False
+    try:
+        log_task_start(task_name, **context)
+        
+        first_webhook_result = context['task_instance'].xcom_pull(task_ids='invoke_first_webhook')
+        if first_webhook_result['status'] == 'skipped':
+            logger.info("No webhook configuration provided. Skipping webhook calls.")
+            success = True
+            return {"status": "skipped", "message": "No webhook configuration provided"}
+        
+        upstream = context['task_instance'].xcom_pull(task_ids='prepare_terraform_vars')
+        webhook_config = upstream['webhook_config']
+        private_ip = first_webhook_result['private_ip']
         
         # Second webhook
         second_webhook_data = {
@@ -376,23 +501,24 @@ def invoke_webhooks(**context) -> Dict[str, Any]:
             "token": webhook_config['token']
         }
         
-        logger.info(f"Invoking second webhook with data: {json.dumps(second_webhook_data)}")
-        response = requests.post(
+        logger.debug("Invoking second webhook with data: %s", CompactJson(second_webhook_data))
+        response = _WEBHOOK_SESSION.post(
             webhook_config['url'],
             json=second_webhook_data,
-            headers={'Content-Type': 'application/json'}
+            headers={'Content-Type': 'application/json'},
+            timeout=WEBHOOK_TIMEOUT
         )
         response.raise_for_status()
         logger.info(f"Second webhook response: {response.text}")
         
-        log_task_end(task_name, True, **context)
+        success = True
         return {"status": "success", "private_ip": private_ip}
         
-    except Exception as e:
-        logger.error(f"Error in {task_name}: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
-        log_task_end(task_name, False, **context)
+    except Exception:
+        logger.exception("Error in %s", task_name)
         raise
+    finally:
+        log_task_end(task_name, success, **context)
 
 # Create the DAG
 dag = DAG(
@@ -402,6 +528,7 @@ dag = DAG(
     schedule_interval=None,
     catchup=False,
     tags=['terraform', 'infrastructure'],
+    on_failure_callback=notify_dag_run_failure,
 )
 
 # Define tasks
@@ -412,60 +539,74 @@ prepare_terraform_vars_task = PythonOperator(
     dag=dag,
 )
 
-terraform_init = BashOperator(
-    task_id='terraform_init',
-    bash_command='''
-        cd {{ task_instance.xcom_pull(task_ids="prepare_terraform_vars")["base_dir"] }}
-        # Create a unique workspace for this request
-        WORKSPACE_NAME="{{ task_instance.xcom_pull(task_ids="prepare_terraform_vars")["request_id"] }}"
-        terraform workspace new $WORKSPACE_NAME || terraform workspace select $WORKSPACE_NAME
-        terraform init -input=false
-    ''',
-    dag=dag,
-)
-
 terraform_apply = BashOperator(
     task_id='terraform_apply',
     bash_command='''
-        cd {{ task_instance.xcom_pull(task_ids="prepare_terraform_vars")["base_dir"] }}
-        
-        # Get variables from previous task
-        VARS=$(python3 -c '
-import json
-import sys
-vars = {{ task_instance.xcom_pull(task_ids="prepare_terraform_vars")["variables"] | tojson }}
-tf_vars = []
-for k, v in vars.items():
-    if isinstance(v, (list, dict)):
-        v = json.dumps(v)
-    elif isinstance(v, str) and k == "security_group_ids":
-        v = json.dumps(v)
-    tf_vars.append(f"-var {k}=\'{v}\'")
-print(" ".join(tf_vars))
-')
+        {% set upstream = task_instance.xcom_pull(task_ids="prepare_terraform_vars") %}
+        cd {{ upstream["base_dir"] }}
+        # Create a unique workspace for this request
+        WORKSPACE_NAME="{{ upstream["request_id"] }}"
+        terraform workspace select -or-create $WORKSPACE_NAME
+        terraform init -input=false
+        
+        # Render variables from previous task into a per-request var file
+        TFVARS_FILE=$(mktemp --suffix=.tfvars.json)
+        trap 'rm -f "$TFVARS_FILE"' EXIT
+        cat > "$TFVARS_FILE" <<'TFVARS'
+{{ upstream["variables"] | tojson }}
+TFVARS
         
         # Print environment variables for debugging
         echo "AWS_ACCESS_KEY_ID: $AWS_ACCESS_KEY_ID"
         echo "AWS_SECRET_ACCESS_KEY: ${AWS_SECRET_ACCESS_KEY:0:5}..."
         echo "AWS_DEFAULT_REGION: $AWS_DEFAULT_REGION"
-        echo "Terraform variables: $VARS"
+        echo "Terraform variables file: $TFVARS_FILE"
         
         # Run terraform apply with detailed output
-        terraform apply -auto-approve $VARS 2>&1
+        terraform apply -auto-approve -parallelism=${TF_PARALLELISM:-24} -var-file="$TFVARS_FILE" 2>&1
     ''',
+    # Tunable without a deploy via the terraform_parallelism Airflow Variable
+    env={'TF_PARALLELISM': "{{ var.value.get('terraform_parallelism', '24') }}"},
+    append_env=True,
     dag=dag,
 )
 
-check_instance_health_task = PythonOperator(
+extract_instance_details_task = PythonOperator(
+    task_id='extract_instance_details',
+    python_callable=extract_instance_details,
+    provide_context=True,
+    pool=AWS_API_POOL,
+    dag=dag,
+)
+
+check_instance_health_task = InstanceHealthSensor(
     task_id='check_instance_health',
-    python_callable=check_instance_health,
+    poke_interval=30,
+    timeout=1800,
+    mode='reschedule',
+    exponential_backoff=True,
+    max_wait=timedelta(minutes=5),
+    pool=AWS_API_POOL,
+    dag=dag,
+)
+
+invoke_first_webhook_task = PythonOperator(
+    task_id='invoke_first_webhook',
+    python_callable=invoke_first_webhook,
     provide_context=True,
     dag=dag,
 )
 
-invoke_webhooks_task = PythonOperator(
-    task_id='invoke_webhooks',
-    python_callable=invoke_webhooks,
+# Deferrable wait so no worker slot is held between the two webhook calls
+wait_for_second_webhook = DateTimeSensorAsync(
+    task_id='wait_for_second_webhook',
+    target_time='{{ task_instance.xcom_pull(task_ids="invoke_first_webhook")["second_webhook_at"] }}',
+    dag=dag,
+)
+
+invoke_second_webhook_task = PythonOperator(
+    task_id='invoke_second_webhook',
+    python_callable=invoke_second_webhook,
     provide_context=True,
     dag=dag,
 )
@@ -473,14 +614,15 @@ invoke_webhooks_task = PythonOperator(
 cleanup_workspace = BashOperator(
     task_id='cleanup_workspace',
     bash_command='''
-        cd {{ task_instance.xcom_pull(task_ids="prepare_terraform_vars")["base_dir"] }}
+        {% set upstream = task_instance.xcom_pull(task_ids="prepare_terraform_vars") %}
+        cd {{ upstream["base_dir"] }}
         # Switch to default workspace before deleting the request workspace
         terraform workspace select default
-        WORKSPACE_NAME="{{ task_instance.xcom_pull(task_ids="prepare_terraform_vars")["request_id"] }}"
+        WORKSPACE_NAME="{{ upstream["request_id"] }}"
         terraform workspace delete -force $WORKSPACE_NAME
     ''',
     dag=dag,
 )
 
 # Set task dependencies
-prepare_terraform_vars_task >> terraform_init >> terraform_apply >> check_instance_health_task >> invoke_webhooks_task >> cleanup_workspace 
\ No newline at end of file
+prepare_terraform_vars_task >> terraform_apply >> extract_instance_details_task >> check_instance_health_task >> invoke_first_webhook_task >> wait_for_second_webhook >> invoke_second_webhook_task >> cleanup_workspace 
\ No newline at end of file
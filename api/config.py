@@ -9,6 +9,11 @@ class Settings(BaseSettings):
     AWS_ACCESS_KEY_ID: str = ""
     AWS_SECRET_ACCESS_KEY: str = ""
     AWS_DEFAULT_REGION: str = ""
+    AIRFLOW_CONNECT_TIMEOUT: float = 3.0
+    AIRFLOW_READ_TIMEOUT: float = 30.0
+    MAX_STORED_REQUESTS: int = 10000
+    # Seconds a running DAG run status is served from cache; finished runs are cached until evicted
+    STATUS_CACHE_TTL: float = 2.0
     
     class Config:
         env_file = ".env"
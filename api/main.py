@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 import uuid
+from collections import OrderedDict
+from itertools import islice
 from typing import Dict, List
-import asyncio
 from datetime import datetime
 
+from config import get_settings
+
 from models import (
     BareMetalRequest,
     ProvisioningResponse,
@@ -13,7 +16,7 @@ from models import (
     AWSInstanceConfig,
     OCIInstanceConfig
 )
-from services.airflow import AirflowService
+from services.airflow import AirflowService, get_airflow_service
 
 app = FastAPI(title="Bare Metal Provisioning API")
 
@@ -26,14 +29,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Airflow service
-airflow_service = AirflowService()
+@app.on_event("shutdown")
+async def close_airflow_service() -> None:
+    airflow_service = get_airflow_service()
+    airflow_service.close()
+    await airflow_service.aclose()
+
+# In-memory storage for requests (replace with database in production).
+# Bounded FIFO: the oldest requests are evicted once MAX_STORED_REQUESTS is reached. Entries are never
+# reordered on reads, so /requests pages over a stable insertion order.
+requests: "OrderedDict[str, Dict]" = OrderedDict()
 
-# In-memory storage for requests (replace with database in production)
-requests: Dict[str, Dict] = {}
+def store_request(request_id: str, data: Dict) -> None:
+    """Store request details, evicting the oldest entries beyond the cap."""
+    requests[request_id] = data
+    max_stored = get_settings().MAX_STORED_REQUESTS
+    while len(requests) > max_stored:
+        requests.popitem(last=False)
 
 @app.post("/provision", response_model=ProvisioningResponse)
-async def create_provisioning_request(request: BareMetalRequest):
+async def create_provisioning_request(
+    request: BareMetalRequest,
+    airflow_service: AirflowService = Depends(get_airflow_service)
+):
     request_id = str(uuid.uuid4())
     
     # Validate provider-specific configuration
@@ -42,18 +60,21 @@ async def create_provisioning_request(request: BareMetalRequest):
     elif request.cloud_provider == CloudProvider.OCI and not isinstance(request.provider_config, OCIInstanceConfig):
         raise HTTPException(status_code=400, detail="OCI configuration is required for OCI provider")
     
+    # Serialize the request once for both the DAG conf and the request store
+    payload = request.model_dump(mode='json')
+    
     try:
-        # Trigger Airflow DAG
-        dag_run = airflow_service.trigger_dag(request.dict())
+        # Trigger Airflow DAG without blocking the event loop so other requests keep being served
+        dag_run = await airflow_service.atrigger_dag(payload)
         
         # Store request details with DAG run ID
-        requests[request_id] = {
-            "request": request.dict(),
+        store_request(request_id, {
+            "request": payload,
             "status": ProvisioningStatus.IN_PROGRESS,
             "created_at": datetime.utcnow(),
             "message": "Request received and DAG triggered",
             "dag_run_id": dag_run["dag_run_id"]
-        }
+        })
         
         return ProvisioningResponse(
             request_id=request_id,
@@ -65,7 +86,10 @@ async def create_provisioning_request(request: BareMetalRequest):
         raise HTTPException(status_code=500, detail=f"Failed to trigger DAG: {str(e)}")
 
 @app.get("/status/{request_id}", response_model=ProvisioningResponse)
-async def get_provisioning_status(request_id: str):
+async def get_provisioning_status(
+    request_id: str,
+    airflow_service: AirflowService = Depends(get_airflow_service)
+):
     if request_id not in requests:
         raise HTTPException(status_code=404, detail="Request not found")
     
@@ -73,7 +97,7 @@ async def get_provisioning_status(request_id: str):
     
     try:
         # Get DAG run status from Airflow
-        dag_run_status = airflow_service.get_dag_run_status(request_data["dag_run_id"])
+        dag_run_status = await airflow_service.aget_dag_run_status(request_data["dag_run_id"])
         
         # Update status based on DAG run state
         if dag_run_status["state"] == "success":
@@ -100,7 +124,10 @@ async def get_provisioning_status(request_id: str):
     )
 
 @app.get("/requests", response_model=List[ProvisioningResponse])
-async def list_provisioning_requests():
+async def list_provisioning_requests(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
     return [
         ProvisioningResponse(
             request_id=request_id,
@@ -108,7 +135,7 @@ async def list_provisioning_requests():
             message=data["message"],
             instance_details=data.get("instance_details")
         )
-        for request_id, data in requests.items()
+        for request_id, data in islice(requests.items(), offset, offset + limit)
     ]
 
 if __name__ == "__main__":
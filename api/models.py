@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Union
 from enum import Enum
 
@@ -9,6 +9,8 @@ class CloudProvider(str, Enum):
 
 class BaseProviderConfig(BaseModel):
     """Base configuration for all cloud providers"""
+    model_config = ConfigDict(extra='forbid')
+    
     region: str = Field(..., description="Cloud provider region")
     instance_type: str = Field(..., description="Instance type/size")
     tags: Optional[Dict[str, str]] = Field(default={}, description="Additional tags for the instance")
@@ -18,6 +20,7 @@ class AWSInstanceConfig(BaseProviderConfig):
     subnet_id: str = Field(..., description="VPC subnet ID")
     security_group_ids: List[str] = Field(..., description="List of security group IDs")
     ami_id: str = Field(..., description="AMI ID for the instance")
+    require_status_checks: bool = Field(default=False, description="Wait for EC2 status checks to pass instead of only the running state")
 
 class OCIInstanceConfig(BaseProviderConfig):
     """OCI-specific configuration"""
@@ -28,6 +31,8 @@ class OCIInstanceConfig(BaseProviderConfig):
     availability_domain: str = Field(..., description="OCI availability domain")
 
 class BareMetalRequest(BaseModel):
+    model_config = ConfigDict(extra='forbid')
+    
     cloud_provider: CloudProvider = Field(..., description="Cloud provider to use")
     provider_config: Union[AWSInstanceConfig, OCIInstanceConfig] = Field(..., description="Provider-specific configuration")
     instance_name_prefix: str = Field(..., description="Prefix for instance names")
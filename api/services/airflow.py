@@ -1,62 +1,277 @@
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
-from typing import Dict, Any
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import cache, lru_cache
+from operator import itemgetter
+from typing import Dict, Any, List, Optional, Tuple
 from config import get_settings
 
+# DAG run states that never change once reached
+TERMINAL_DAG_RUN_STATES = frozenset({"success", "failed"})
+
+# Provisioning request fields passed through to the DAG run conf
+DAG_CONF_KEYS = ("cloud_provider", "provider_config", "instance_name_prefix", "count")
+_get_dag_conf = itemgetter(*DAG_CONF_KEYS)
+
+# Largest page the dagRuns list endpoint returns with the default maximum_page_limit
+DAG_RUNS_PAGE_LIMIT = 100
+
+# Fewest uncached runs worth a list call; every run on the page carries its full conf, so
+# a handful of runs is cheaper to fetch one by one
+DAG_RUNS_BATCH_THRESHOLD = 5
+
+@cache
+def _basic_auth_header(username: str, password: str) -> str:
+    """Encode the Basic auth header once per credential pair"""
+    return "Basic " + base64.b64encode(f"{username}:{password}".encode("ascii")).decode("ascii")
+
+class AirflowAPIError(Exception):
+    """Raised when the Airflow REST API answers with an error status"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"Airflow API returned {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
 class AirflowService:
     def __init__(self):
         self.settings = get_settings()
         self.base_url = self.settings.AIRFLOW_API_URL
-        auth_string = f"{self.settings.AIRFLOW_USERNAME}:{self.settings.AIRFLOW_PASSWORD}"
-        auth_bytes = auth_string.encode('ascii')
-        auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
+        self._dag_id = self.settings.AIRFLOW_DAG_ID
+        # The DAG is fixed for the service lifetime, so build its dagRuns URL once
+        self._dag_runs_url = f"{self.base_url}/dags/{self._dag_id}/dagRuns"
         self.headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Basic {auth_b64}"
+            "Authorization": _basic_auth_header(self.settings.AIRFLOW_USERNAME, self.settings.AIRFLOW_PASSWORD)
         }
+        # (connect, read) timeouts so a hung webserver cannot block callers indefinitely
+        self.timeout = (self.settings.AIRFLOW_CONNECT_TIMEOUT, self.settings.AIRFLOW_READ_TIMEOUT)
+        # Reuse one session so keep-alive connections and headers are shared across calls
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # Retry transient webserver errors on the pooled connection. Status retries are limited to
+        # GET because a POST to dagRuns that failed with a gateway error may already have created the run.
+        retry = Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Short-lived DAG run status cache shared by the sync and async callers: dag_run_id -> (expires_at, status)
+        self._status_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._status_cache_lock = threading.Lock()
+        # Async client so callers on an event loop can trigger and poll many DAG runs concurrently
+        # over one shared connection pool
+        self.aclient = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(self.settings.AIRFLOW_READ_TIMEOUT, connect=self.settings.AIRFLOW_CONNECT_TIMEOUT),
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=75),
+                retries=3
+            )
+        )
 
-    def trigger_dag(self, conf: Dict[str, Any]) -> Dict[str, Any]:
+    def close(self) -> None:
         """
-        Trigger a DAG with the given configuration
+        Close the underlying HTTP session and its pooled connections
         """
-        url = f"{self.base_url}/dags/{self.settings.AIRFLOW_DAG_ID}/dagRuns"
-        
-        # Format the configuration for the DAG
-        dag_conf = {
-            "cloud_provider": conf["cloud_provider"],
-            "provider_config": conf["provider_config"],
-            "instance_name_prefix": conf["instance_name_prefix"],
-            "count": conf["count"]
-        }
-        
-        payload = {
-            "conf": dag_conf,
+        self.session.close()
+
+    async def aclose(self) -> None:
+        """
+        Close the async HTTP client and its pooled connections
+        """
+        await self.aclient.aclose()
+
+    def _cached_status(self, dag_run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached status of a DAG run if it has not expired yet
+        """
+        with self._status_cache_lock:
+            entry = self._status_cache.get(dag_run_id)
+            if entry is None:
+                return None
+            expires_at, status = entry
+            if time.monotonic() >= expires_at:
+                del self._status_cache[dag_run_id]
+                return None
+            return status
+
+    def _cache_status(self, dag_run_id: str, status: Dict[str, Any]) -> None:
+        """
+        Cache a DAG run status; finished runs never change, so they stay until evicted or invalidated
+        """
+        if status.get("state") in TERMINAL_DAG_RUN_STATES:
+            expires_at = math.inf
+        else:
+            expires_at = time.monotonic() + self.settings.STATUS_CACHE_TTL
+        with self._status_cache_lock:
+            self._status_cache[dag_run_id] = (expires_at, status)
+            self._status_cache.move_to_end(dag_run_id)
+            while len(self._status_cache) > self.settings.MAX_STORED_REQUESTS:
+                self._status_cache.popitem(last=False)
+
+    def invalidate(self, dag_run_id: str) -> None:
+        """
+        Drop the cached status of a DAG run so the next lookup fetches it from Airflow
+        """
+        with self._status_cache_lock:
+            self._status_cache.pop(dag_run_id, None)
+
+    @staticmethod
+    def _dag_run_payload(conf: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the dagRuns request body from the provisioning request
+        """
+        return {
+            "conf": dict(zip(DAG_CONF_KEYS, _get_dag_conf(conf))),
             "note": "Triggered via API"
         }
+
+    def trigger_dag(self, conf: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Trigger a DAG with the given configuration
+        """
+        url = self._dag_runs_url
         
-        response = requests.post(
+        response = self.session.post(
             url,
-            headers=self.headers,
-            json=payload
+            data=orjson.dumps(self._dag_run_payload(conf)),
+            timeout=self.timeout
         )
         
-        if response.status_code not in (200, 201):
-            raise Exception(f"Failed to trigger DAG: {response.text}")
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            raise AirflowAPIError(e.response.status_code, e.response.text) from e
         
-        return response.json()
+        return orjson.loads(response.content)
 
     def get_dag_run_status(self, dag_run_id: str) -> Dict[str, Any]:
         """
         Get the status of a DAG run
         """
-        url = f"{self.base_url}/dags/{self.settings.AIRFLOW_DAG_ID}/dagRuns/{dag_run_id}"
+        cached = self._cached_status(dag_run_id)
+        if cached is not None:
+            return cached
+        
+        url = f"{self._dag_runs_url}/{dag_run_id}"
+        
+        response = self.session.get(url, timeout=self.timeout)
+        
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            raise AirflowAPIError(e.response.status_code, e.response.text) from e
+        
+        status = orjson.loads(response.content)
+        self._cache_status(dag_run_id, status)
+        return status
+
+    def get_dag_run_state(self, dag_run_id: str) -> Optional[str]:
+        """
+        Get only the state of a DAG run
+        """
+        # A full orjson parse of the (key-sorted) response is cheaper than streaming it with ijson,
+        # which still has to lex the conf preceding "state", and reading the whole body keeps the
+        # keep-alive connection reusable. The full status is cached for later lookups.
+        return self.get_dag_run_status(dag_run_id).get("state")
+
+    def get_dag_run_statuses(self, dag_run_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the status of several DAG runs, keyed by DAG run ID
+        """
+        statuses = {}
+        pending = []
+        for dag_run_id in dag_run_ids:
+            cached = self._cached_status(dag_run_id)
+            if cached is not None:
+                statuses[dag_run_id] = cached
+            else:
+                pending.append(dag_run_id)
+        if len(pending) < DAG_RUNS_BATCH_THRESHOLD:
+            for dag_run_id in pending:
+                statuses[dag_run_id] = self.get_dag_run_status(dag_run_id)
+            return statuses
+        
+        # The list endpoint cannot filter by run ID, but the runs being tracked are usually
+        # among the most recent ones, so one page covers most of them in a single call
+        response = self.session.get(
+            self._dag_runs_url,
+            params={"order_by": "-execution_date", "limit": DAG_RUNS_PAGE_LIMIT},
+            timeout=self.timeout
+        )
         
-        response = requests.get(
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            raise AirflowAPIError(e.response.status_code, e.response.text) from e
+        
+        wanted = set(pending)
+        for dag_run in orjson.loads(response.content)["dag_runs"]:
+            dag_run_id = dag_run["dag_run_id"]
+            if dag_run_id in wanted:
+                statuses[dag_run_id] = dag_run
+                self._cache_status(dag_run_id, dag_run)
+        
+        # Older runs fall outside the page and are fetched one by one
+        for dag_run_id in pending:
+            if dag_run_id not in statuses:
+                statuses[dag_run_id] = self.get_dag_run_status(dag_run_id)
+        
+        return statuses
+
+    async def atrigger_dag(self, conf: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Trigger a DAG with the given configuration without blocking the event loop
+        """
+        url = self._dag_runs_url
+        
+        response = await self.aclient.post(
             url,
-            headers=self.headers
+            content=orjson.dumps(self._dag_run_payload(conf))
         )
         
-        if response.status_code != 200:
-            raise Exception(f"Failed to get DAG run status: {response.text}")
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise AirflowAPIError(e.response.status_code, e.response.text) from e
         
-        return response.json() 
\ No newline at end of file
+        return orjson.loads(response.content)
+
+    async def aget_dag_run_status(self, dag_run_id: str) -> Dict[str, Any]:
+        """
+        Get the status of a DAG run without blocking the event loop
+        """
+        cached = self._cached_status(dag_run_id)
+        if cached is not None:
+            return cached
+        
+        url = f"{self._dag_runs_url}/{dag_run_id}"
+        
+        response = await self.aclient.get(url)
+        
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise AirflowAPIError(e.response.status_code, e.response.text) from e
+        
+        status = orjson.loads(response.content)
+        self._cache_status(dag_run_id, status)
+        return status
+
+# One shared service per process so its pooled connections are reused across requests
+@lru_cache()
+def get_airflow_service() -> AirflowService:
+    return AirflowService()
@@ -18,6 +18,10 @@ docker-compose exec airflow-webserver airflow users create \
     --role Admin \
     --email admin@example.com
 
+# Create the pool that bounds concurrent AWS API callers across DAG runs
+echo "Creating aws_api pool..."
+docker-compose exec airflow-webserver airflow pools set aws_api 4 "Bounds concurrent AWS API and terraform output calls"
+
 # Start all services
 echo "Starting all services..."
 docker-compose up -d
@@ -151,6 +151,10 @@ $DOCKER_COMPOSE_CMD run --rm airflow-init airflow users create \
     --email admin@example.com \
     --password admin
 
+# Create the pool that bounds concurrent AWS API callers across DAG runs
+print_message "Creating aws_api pool..." "$YELLOW"
+$DOCKER_COMPOSE_CMD run --rm airflow-init airflow pools set aws_api 4 "Bounds concurrent AWS API and terraform output calls"
+
 # Start the remaining services
 print_message "Starting remaining services..." "$YELLOW"
 $DOCKER_COMPOSE_CMD up -d